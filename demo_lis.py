@@ -89,6 +89,12 @@ def demo_examples():
         ),
     ]
 
+    # Parse and compile every example once, before any of them is run
+    examples = [
+        (category, [lis.prepare(expr) for expr in expressions])
+        for category, expressions in examples
+    ]
+
     env = lis.standard_env()
 
     for category, expressions in examples:
@@ -97,13 +103,13 @@ def demo_examples():
 
         for expr in expressions:
             try:
-                result = lis.eval(lis.parse(expr), env)
+                result = lis.run(expr, env)
                 if result is not None:
-                    print(f"  {expr:40} => {lis.lispstr(result)}")
+                    print(f"  {expr.source:40} => {lis.lispstr(result)}")
                 else:
-                    print(f"  {expr:40} => ✓")
+                    print(f"  {expr.source:40} => ✓")
             except Exception as e:
-                print(f"  {expr:40} => Error: {e}")
+                print(f"  {expr.source:40} => Error: {e}")
 
     print("\n🎉 Demo completed!")
 
@@ -126,7 +132,7 @@ def interactive_demo():
                 break
 
             if user_input:
-                result = lis.eval(lis.parse(user_input), env)
+                result = lis.run(user_input, env)
                 if result is not None:
                     print(f"=> {lis.lispstr(result)}")
 
@@ -5,16 +5,129 @@
 ################
 
 
+import builtins
+import functools
 import math
 import operator as op
-from typing import Any
+import re
+import sys
+from typing import Any, Callable, Iterable
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional: map then calls procedures one by one
+    np = None
 
 ################ Types
 
 Symbol = str  # A Lisp Symbol is implemented as a Python str
-List = list  # A Lisp List is implemented as a Python list
+List = list  # A Lisp List in a parsed program is implemented as a Python list
 Number = int | float  # A Lisp Number is implemented as a Python int or float
 
+# Symbols are interned as they are read, and so are these special-form
+# keywords, so comparing a symbol against one succeeds on identity.
+_quote, _if, _define, _define_memo, _set, _lambda = map(
+    sys.intern, ["quote", "if", "define", "define-memo", "set!", "lambda"]
+)
+
+################ Pairs: the lists that Scheme programs build
+
+
+class Pair:
+    "A cons cell. A Lisp list value is a chain of Pairs ending in nil."
+
+    __slots__ = ("car", "cdr")
+
+    def __init__(self, car: Any, cdr: Any):
+        self.car = car
+        self.cdr = cdr
+
+    def __iter__(self):
+        "Iterate over the elements of the list."
+        p = self
+        while isinstance(p, Pair):
+            yield p.car
+            p = p.cdr
+
+    def __eq__(self, other):
+        "Lists are equal when their elements are; Python lists compare as lists."
+        if isinstance(other, List):
+            other = make_list(other)
+        if not isinstance(other, Pair):
+            return NotImplemented
+        a, b = self, other
+        while isinstance(a, Pair) and isinstance(b, Pair):
+            if a.car is not b.car and a.car != b.car:
+                return False
+            a, b = a.cdr, b.cdr
+        return a == b
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self):
+        return lispstr(self)
+
+
+class Nil:
+    "The type of nil, the empty list."
+
+    __slots__ = ()
+
+    def __iter__(self):
+        return iter(())
+
+    def __bool__(self):
+        return False
+
+    def __eq__(self, other):
+        return other is self or (isinstance(other, List) and not other)
+
+    __hash__ = object.__hash__
+
+    def __repr__(self):
+        return "()"
+
+
+nil = Nil()
+
+
+def make_list(items: Iterable) -> Pair | Nil:
+    "A Lisp list of the items."
+    result = nil
+    if not isinstance(items, (List, tuple)):
+        items = list(items)
+    for x in reversed(items):
+        result = Pair(x, result)
+    return result
+
+
+def quoted(exp: Any) -> Any:
+    "The value of (quote exp): the nested Python lists of exp as Lisp lists."
+    if isinstance(exp, List):
+        return make_list([quoted(x) for x in exp])
+    return exp
+
+
+def length(x: Pair | Nil) -> int:
+    "The number of elements in a Lisp list."
+    n = 0
+    while isinstance(x, Pair):
+        n += 1
+        x = x.cdr
+    return n
+
+
+def append(*lists: Pair | Nil) -> Any:
+    "A list of the elements of all the lists; the last one is shared, not copied."
+    if not lists:
+        return nil
+    *init, result = lists
+    for x in reversed(init):
+        for item in reversed(list(x)):
+            result = Pair(item, result)
+    return result
+
+
 ################ Parsing: parse, tokenize, and read_from_tokens
 
 
@@ -23,48 +136,64 @@ def parse(program: str) -> Any:
     return read_from_tokens(tokenize(program))
 
 
+_TOKEN_RE = re.compile(r"[()]|[^\s()]+")  # a paren, or a run up to space or paren
+
+
 def tokenize(s: str) -> list[str]:
     "Convert a string into a list of tokens."
-    return s.replace("(", " ( ").replace(")", " ) ").split()
+    return _TOKEN_RE.findall(s)
 
 
 def read_from_tokens(tokens: list[str]) -> Any:
-    "Read an expression from a sequence of tokens."
-    if len(tokens) == 0:
-        raise SyntaxError("unexpected EOF while reading")
-    token = tokens.pop(0)
-    if "(" == token:
-        L = []
-        while len(tokens) > 0 and tokens[0] != ")":
-            L.append(read_from_tokens(tokens))
-        if len(tokens) == 0:
-            raise SyntaxError(
-                "unexpected EOF while reading - missing closing parenthesis"
-            )
-        tokens.pop(0)  # pop off ')'
-        return L
-    elif ")" == token:
-        raise SyntaxError("unexpected )")
-    else:
-        return atom(token)
+    "Read an expression from a sequence of tokens, consuming them."
+    stack: list[list] = []  # enclosing lists still waiting for their ')'
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        i += 1
+        if "(" == token:
+            stack.append([])
+            continue
+        elif ")" == token:
+            if not stack:
+                raise SyntaxError("unexpected )")
+            exp = stack.pop()
+        else:
+            exp = atom(token)
+        if not stack:  # a complete expression
+            del tokens[:i]
+            return exp
+        stack[-1].append(exp)
+    if stack:
+        raise SyntaxError(
+            "unexpected EOF while reading - missing closing parenthesis"
+        )
+    raise SyntaxError("unexpected EOF while reading")
 
 
 def atom(token: str) -> Symbol | Number:
-    "Numbers become numbers; every other token is a symbol."
-    try:
-        return int(token)
-    except ValueError:
+    "Numbers become numbers; every other token is an interned symbol."
+    c = token[0]
+    # Only try the numeric conversions for tokens that can start a number,
+    # so that symbols (the common case) raise no exceptions.
+    if c.isdigit() or (
+        c in "+-." and len(token) > 1 and (token[1].isdigit() or token[1] == ".")
+    ):
         try:
-            return float(token)
+            return int(token)
         except ValueError:
-            return Symbol(token)
+            try:
+                return float(token)
+            except ValueError:
+                pass
+    return sys.intern(token)
 
 
 ################ Environments
 
 
-def standard_env() -> "Env":
-    "An environment with some Scheme standard procedures."
+def standard_env() -> "GlobalEnv":
+    "A global environment with some Scheme standard procedures."
 
     def scheme_apply(proc, args):
         """Apply a procedure to a list of arguments."""
@@ -73,18 +202,23 @@ def standard_env() -> "Env":
         else:
             raise TypeError(f"'{proc}' is not callable")
 
+    def scheme_map(proc, *lists):
+        """Apply a procedure to each element of lists, giving a list."""
+        if len(lists) == 1:
+            result = _vector_map(proc, lists[0])
+            if result is not None:
+                return result
+        return make_list(map(proc, *lists))
+
     def variadic_add(*args):
-        """Addition that accepts multiple arguments."""
-        return sum(args)
+        """Addition that accepts multiple arguments, folding left like BINARY_ADD."""
+        return functools.reduce(op.add, args, 0)
 
     def variadic_mul(*args):
         """Multiplication that accepts multiple arguments."""
-        result = 1
-        for x in args:
-            result *= x
-        return result
+        return functools.reduce(op.mul, args, 1)
 
-    env = Env()
+    env = {}
     env.update(vars(math))  # sin, cos, sqrt, pi, ...
     env.update(
         {
@@ -98,46 +232,91 @@ def standard_env() -> "Env":
             "<=": op.le,
             "=": op.eq,
             "abs": abs,
-            "append": op.add,
+            "append": append,
             "apply": scheme_apply,
             "begin": lambda *x: x[-1],
-            "car": lambda x: x[0],
-            "cdr": lambda x: x[1:],
-            "cons": lambda x, y: [x] + y,
+            "car": lambda x: x.car,
+            "cdr": lambda x: x.cdr,
+            "cons": Pair,
             "eq?": op.is_,
             "equal?": op.eq,
-            "length": len,
-            "list": lambda *x: list(x),
-            "list?": lambda x: isinstance(x, list),
-            "map": map,
+            "length": length,
+            "list": lambda *x: make_list(x),
+            "list?": lambda x: isinstance(x, (Pair, Nil)),
+            "map": scheme_map,
             "max": max,
             "min": min,
             "not": op.not_,
-            "null?": lambda x: x == [],
+            "null?": lambda x: x is nil,
             "number?": lambda x: isinstance(x, Number),
             "procedure?": callable,
             "round": round,
             "symbol?": lambda x: isinstance(x, Symbol),
         }
     )
-    return env
+    return GlobalEnv(env)
+
 
+class Frame:
+    "A local environment: the slots of one procedure call, with an outer Frame."
 
-class Env(dict):
-    "An environment: a dict of {'var':val} pairs, with an outer Env."
+    __slots__ = ("slots", "outer")
 
-    def __init__(self, parms=(), args=(), outer: "Env | None" = None):
-        self.update(zip(parms, args))
+    def __init__(self, slots: list, outer: "Frame | None" = None):
+        self.slots = slots
         self.outer = outer
 
-    def find(self, var: str) -> "Env":
-        "Find the innermost Env where var appears."
-        if var in self:
-            return self
-        elif self.outer is not None:
-            return self.outer.find(var)
-        else:
-            raise NameError(f"Variable '{var}' not found")
+
+_global_ids: dict[str, int] = {}  # The number of each global name, by name
+_global_names: list[str] = []  # The global names, by number
+_UNBOUND = object()  # The value of a global slot whose name is not defined
+
+
+def _global_id(var: str) -> int:
+    "The number of a global name, the index of its slot in every GlobalEnv."
+    i = _global_ids.get(var)
+    if i is None:
+        i = _global_ids[var] = len(_global_names)
+        _global_names.append(sys.intern(var))  # keyed like symbols
+    return i
+
+
+class GlobalEnv:
+    """A global environment: a list of values indexed by the numbers of their
+    names, so that compiled code loads a global with one list index.
+    Looking a name up in the environment works as with a dict."""
+
+    __slots__ = ("slots",)
+
+    def __init__(self, bindings: dict[str, Any] | None = None):
+        self.slots: list = []
+        self.update(bindings or {})
+
+    def get(self, var: str, default: Any = None) -> Any:
+        i = _global_ids.get(var)
+        if i is None or i >= len(self.slots) or self.slots[i] is _UNBOUND:
+            return default
+        return self.slots[i]
+
+    def __getitem__(self, var: str) -> Any:
+        value = self.get(var, _UNBOUND)
+        if value is _UNBOUND:
+            raise KeyError(var)
+        return value
+
+    def __setitem__(self, var: str, value: Any) -> None:
+        i = _global_id(var)
+        slots = self.slots
+        if i >= len(slots):  # the slots only grow, as names are never unbound
+            slots.extend([_UNBOUND] * (i + 1 - len(slots)))
+        slots[i] = value
+
+    def __contains__(self, var: str) -> bool:
+        return self.get(var, _UNBOUND) is not _UNBOUND
+
+    def update(self, bindings: dict[str, Any]) -> None:
+        for var, value in bindings.items():
+            self[var] = value
 
 
 global_env = standard_env()
@@ -155,7 +334,7 @@ def repl(prompt: str = "lis.py >>> ") -> None:
     
     while True:
         try:
-            val = eval(parse(input(prompt)))
+            val = eval(parse(input(prompt)), global_env)
             if val is not None:
                 print(lispstr(val))
         except KeyboardInterrupt:
@@ -170,60 +349,840 @@ def repl(prompt: str = "lis.py >>> ") -> None:
             print(f"Unexpected error: {e}")
 
 
+_SPACE, _CLOSE = object(), object()  # Markers of the text between list elements
+
+
 def lispstr(exp: Any) -> str:
-    "Convert a Python object back into a Lisp-readable string."
-    if isinstance(exp, List):
-        return "(" + " ".join(map(lispstr, exp)) + ")"
-    else:
-        return str(exp)
+    """Convert a Python object back into a Lisp-readable string.
+    Nested lists are written from a stack of the values still to write, not by
+    recursion, into one list of pieces that is joined at the end."""
+    out: list[str] = []
+    todo = [exp]  # the values and markers still to write, the next one last
+    while todo:
+        x = todo.pop()
+        if x is _SPACE:
+            out.append(" ")
+        elif x is _CLOSE:
+            out.append(")")
+        elif isinstance(x, (List, Pair)):
+            if isinstance(x, List):
+                items = x
+            else:
+                items = []
+                while isinstance(x, Pair):
+                    items.append(x.car)
+                    x = x.cdr
+                if x is not nil:  # an improper list
+                    items += [".", x]
+            out.append("(")
+            todo.append(_CLOSE)
+            for i, item in enumerate(reversed(items)):
+                if i:
+                    todo.append(_SPACE)
+                todo.append(item)
+        else:
+            out.append(str(x))
+    return "".join(out)
 
 
 ################ Procedures
 
 
+_MISS = object()  # A cache.get default that no Scheme value can be
+
+JIT_THRESHOLD = 10  # Calls after which a Procedure is compiled to Python
+JIT_MAX_DEPTH = 200  # Nested Python calls of Procedures before calls run in place
+_depth = 0  # Calls of Procedures currently nested on the Python stack
+POOL_SIZE = 8  # The most frames of returned calls that a Procedure keeps
+
+
+def _memo_lookup(cache: dict, args: list | tuple) -> tuple[tuple | None, Any]:
+    """The key of a memoized call and its cached value, or _MISS if there is none.
+    The key is None for unhashable arguments, which are not memoized."""
+    key = tuple([(type(arg), arg) for arg in args])  # 2 and 2.0 apart
+    try:
+        return key, cache.get(key, _MISS)
+    except TypeError:
+        return None, _MISS
+
+
 class Procedure:
-    "A user-defined Scheme procedure."
+    """A user-defined Scheme procedure, with a cache of results if memoized.
+    Once called JIT_THRESHOLD times it is compiled to a Python function, jit."""
 
-    def __init__(self, parms: list, body: list, env: Env):
-        self.parms = parms
-        self.body = body
+    __slots__ = ("lam", "env", "genv", "cache", "_pool", "ncalls", "jit")
+
+    def __init__(self, lam: "Lambda", env: Frame | None, genv: list):
+        self.lam = lam
         self.env = env
+        self.genv = genv
+        self.cache: dict[tuple, Any] | None = None
+        self._pool: list[Frame] = []  # frames of returned calls, for reuse
+        self.ncalls = 0
+        self.jit: Callable | None = None
 
     def __call__(self, *args):
-        return eval(self.body, Env(self.parms, args, self.env))
+        global _depth
+        key = None
+        if self.cache is not None:
+            key, value = _memo_lookup(self.cache, args)
+            if value is not _MISS:
+                return value
+        jit = self.jit
+        _depth += 1  # compiled or interpreted, the call nests on the Python stack
+        try:
+            if jit is not None and _depth <= JIT_MAX_DEPTH:
+                value = jit(*args)
+            else:
+                self.ncalls += 1
+                if self.ncalls == JIT_THRESHOLD:
+                    self.jit = _jit(self)
+                frame = self._frame(args)
+                value = _execute(self.lam.code, frame, self.genv)
+                if self.lam.leaf:  # no closure can have captured the frame
+                    self._release(frame)
+        finally:
+            _depth -= 1
+        if key is not None:
+            self.cache[key] = value
+        return value
 
+    def _frame(self, args: list | tuple) -> Frame:
+        "A frame for a call with args, recycled from the pool when possible."
+        lam = self.lam
+        nargs = len(args)
+        if nargs != len(lam.parms):
+            raise TypeError(
+                f"procedure expected {len(lam.parms)} arguments, got {nargs}"
+            )
+        if self._pool:  # recycle the frame of a returned call
+            frame = self._pool.pop()
+            frame.slots[:nargs] = args
+            return frame
+        return Frame([*args, *[None] * (lam.nslots - nargs)], self.env)
 
-################ eval
+    def _release(self, frame: Frame) -> None:
+        "Keep the frame of a returned call for reuse, if the pool has room."
+        pool = self._pool
+        if len(pool) < POOL_SIZE:
+            slots = frame.slots
+            slots[:] = [None] * len(slots)  # hold on to no values of the call
+            pool.append(frame)
+
+
+################ compile
+
+# Opcodes, each paired with one argument in a (op, arg) instruction:
+#   CONST value               push a constant
+#   LOAD_LOCAL (depth, i)     push slot i of the frame depth levels out
+#   LOAD_GLOBAL id            push the value of the global variable numbered id
+#   STORE_LOCAL (depth, i)    set slot i of the frame depth levels out
+#   STORE_GLOBAL id           set! an existing global variable
+#   DEFINE id                 bind a global variable
+#   JUMP_IF_FALSE pc          pop a value and jump if it is false
+#   JUMP pc                   jump unconditionally
+#   JUMP_IF_NOT_LT (i, value, pc)
+#                             jump unless slot i of the frame is < value
+#   JUMP_IF_NOT_GT, JUMP_IF_NOT_LE, JUMP_IF_NOT_GE, JUMP_IF_NOT_EQ
+#                             ... is >, <=, >= or == value
+#   CALL n                    call the procedure below the top n arguments
+#   CALL_PROC n               CALL specialized to a Procedure, run in place
+#   CALL_BUILTIN n            CALL specialized to a Python callable
+#   CALL_BUILTIN_1 1          CALL_BUILTIN for one argument
+#   CALL_BUILTIN_2 2          CALL_BUILTIN for two arguments
+#   TAIL_CALL n               CALL whose value is returned: a Procedure
+#                             replaces the running one instead of nesting
+#   BINARY_ADD None           replace the top two values x, y with x + y
+#   BINARY_SUB None           ... with x - y
+#   BINARY_MUL None           ... with x * y
+#   BINARY_DIV None           ... with x / y
+#   MAKE_CLOSURE lam          push a Procedure for the Lambda lam
+#   RETURN None               return the top of the stack
+#   MEMOIZE None              replace the Procedure on top of the stack with
+#                             a copy that has a cache
+# The STORE opcodes and DEFINE replace the top of the stack with None.
+# The first time a CALL runs, it rewrites itself into one of the specialized
+# CALL opcodes for the kind of procedure it found. CALL_PROC checks that its
+# callee still is a plain Procedure, and makes a generic call if not. The
+# CALL_BUILTIN opcodes rewrite themselves into CALL_PROC for a Procedure.
+(
+    CONST,
+    LOAD_LOCAL,
+    LOAD_GLOBAL,
+    STORE_LOCAL,
+    STORE_GLOBAL,
+    DEFINE,
+    JUMP_IF_FALSE,
+    JUMP,
+    CALL,
+    MAKE_CLOSURE,
+    RETURN,
+    MEMOIZE,
+    CALL_PROC,
+    CALL_BUILTIN,
+    CALL_BUILTIN_1,
+    CALL_BUILTIN_2,
+    TAIL_CALL,
+    BINARY_ADD,
+    BINARY_SUB,
+    BINARY_MUL,
+    BINARY_DIV,
+    JUMP_IF_NOT_LT,
+    JUMP_IF_NOT_GT,
+    JUMP_IF_NOT_LE,
+    JUMP_IF_NOT_GE,
+    JUMP_IF_NOT_EQ,
+) = range(26)
+
+Code = list[tuple[int, Any]]  # A compiled expression: a list of instructions
+
+# Standard procedures that the compiler integrates wherever their names are
+# not bound locally: as Python operators in compiled procedures, by their
+# own opcodes in bytecode, and by computing calls on constant arguments at
+# compile time. For each: its Python operator, the numbers of arguments it
+# takes, its function of two arguments, and its opcode (a left fold over
+# the arguments) or None to compile it as a call. Since compiled code would
+# not see a new global definition of one, programs may bind them locally
+# but not define or set! them globally.
+_OPERATORS = {
+    "+": ("+", range(1, sys.maxsize), op.add, BINARY_ADD),
+    "*": ("*", range(1, sys.maxsize), op.mul, BINARY_MUL),
+    "-": ("-", range(2, 3), op.sub, BINARY_SUB),
+    "/": ("/", range(2, 3), op.truediv, BINARY_DIV),
+    "<": ("<", range(2, 3), op.lt, None),
+    ">": (">", range(2, 3), op.gt, None),
+    "<=": ("<=", range(2, 3), op.le, None),
+    ">=": (">=", range(2, 3), op.ge, None),
+    "=": ("==", range(2, 3), op.eq, None),
+}
+# The jump that fuses each comparison with the if whose test it is
+_COMPARE_JUMPS = {
+    "<": JUMP_IF_NOT_LT,
+    ">": JUMP_IF_NOT_GT,
+    "<=": JUMP_IF_NOT_LE,
+    ">=": JUMP_IF_NOT_GE,
+    "=": JUMP_IF_NOT_EQ,
+}
+Scope = dict[str, int]  # The frame slot of each local variable of a lambda
 
 
-def eval(x: Any, env: Env = global_env) -> Any:
-    "Evaluate an expression in an environment."
+class Lambda:
+    """A compiled (lambda (var...) body): its code and the size of its frame.
+    A leaf lambda creates no closures, so its frames die with its calls."""
+
+    __slots__ = ("parms", "body", "code", "nslots", "leaf")
+
+    def __init__(self, parms: list, body: Any, code: Code, nslots: int):
+        self.parms = parms
+        self.body = body
+        self.code = code
+        self.nslots = nslots
+        self.leaf = all(op != MAKE_CLOSURE for op, _ in code)
+
+
+def compile(x: Any, scopes: list[Scope] | None = None) -> Code:
+    "Compile an expression into bytecode, resolving variables against scopes."
+    code: Code = []
+    _compile(x, code, scopes or [], tail=True)
+    code.append((RETURN, None))
+    return code
+
+
+def _resolve(var: str, scopes: list[Scope]) -> tuple[int, int] | None:
+    "The (depth, slot) of a local variable, or None if var is global."
+    for depth, scope in enumerate(reversed(scopes)):
+        if var in scope:
+            return depth, scope[var]
+    return None
+
+
+def _compile(x: Any, code: Code, scopes: list[Scope], tail: bool = False) -> None:
+    """Append to code the instructions that leave the value of x on the stack.
+    In tail position, the value of x is the value of the code being compiled."""
     if isinstance(x, Symbol):  # variable reference
-        return env.find(x)[x]
+        address = _resolve(x, scopes)
+        if address is None:
+            code.append((LOAD_GLOBAL, _global_id(x)))
+        else:
+            code.append((LOAD_LOCAL, address))
     elif not isinstance(x, List):  # constant literal
-        return x
+        code.append((CONST, x))
     else:  # list expression
-        match x[0]:
-            case "quote":  # (quote exp)
-                _, exp = x
-                return exp
-            case "if":  # (if test conseq alt)
-                _, test, conseq, alt = x
-                exp = conseq if eval(test, env) else alt
-                return eval(exp, env)
-            case "define":  # (define var exp)
-                _, var, exp = x
-                env[var] = eval(exp, env)
-            case "set!":  # (set! var exp)
-                _, var, exp = x
-                env.find(var)[var] = eval(exp, env)
-            case "lambda":  # (lambda (var...) body)
-                _, parms, body = x
-                return Procedure(parms, body, env)
-            case _:  # (proc arg...)
-                proc = eval(x[0], env)
-                args = [eval(exp, env) for exp in x[1:]]
-                return proc(*args)
+        head = x[0]
+        special_form = _SPECIAL_FORMS.get(head) if isinstance(head, Symbol) else None
+        if special_form is not None:
+            special_form(x, code, scopes, tail)
+        else:
+            _compile_call(x, code, scopes, tail)
+
+
+def _compile_call(x: list, code: Code, scopes: list[Scope], tail: bool) -> None:
+    """(proc arg...)
+    Calls of the standard operators on constants are computed right away."""
+    head, *args = x
+    function = opcode = None
+    if isinstance(head, Symbol) and head in _OPERATORS:
+        _, nargs, function, opcode = _OPERATORS[head]
+        if _resolve(head, scopes) is not None or len(args) not in nargs:
+            function = opcode = None
+    start = len(code)
+    if opcode is None:
+        _compile(head, code, scopes)
+    constants = []
+    for i, arg in enumerate(args):
+        before = len(code)
+        _compile(arg, code, scopes)
+        value = code[before][1]
+        if len(code) == before + 1 and code[before][0] == CONST:
+            if isinstance(value, Number):
+                constants.append(value)
+        if opcode is not None and i > 0:
+            code.append((opcode, None))
+    if opcode is None:
+        code.append((TAIL_CALL if tail else CALL, len(args)))
+    if function is not None and len(constants) == len(args):
+        try:
+            code[start:] = [(CONST, functools.reduce(function, constants))]
+        except ArithmeticError:  # such as division by zero: raise it when run
+            pass
+
+
+def _compile_quote(x: list, code: Code, scopes: list[Scope], tail: bool) -> None:
+    "(quote exp)"
+    _, exp = x
+    code.append((CONST, quoted(exp)))
+
+
+def _compile_if(x: list, code: Code, scopes: list[Scope], tail: bool) -> None:
+    "(if test conseq alt)"
+    _, test, conseq, alt = x
+    compare = _compare_jump(test, scopes)
+    if compare is None:
+        start = len(code)
+        _compile(test, code, scopes)
+        if len(code) == start + 1 and code[start][0] == CONST:  # known test
+            _, value = code.pop()
+            _compile(conseq if value else alt, code, scopes, tail)
+            return
+    branch = len(code)
+    code.append((JUMP_IF_FALSE, None))  # target patched below
+    _compile(conseq, code, scopes, tail)
+    skip = len(code)
+    code.append((JUMP, None))  # target patched below
+    if compare is None:
+        code[branch] = (JUMP_IF_FALSE, len(code))
+    else:
+        opcode, i, value = compare
+        code[branch] = (opcode, (i, value, len(code)))
+    _compile(alt, code, scopes, tail)
+    code[skip] = (JUMP, len(code))
+
+
+def _compare_jump(test: Any, scopes: list[Scope]) -> tuple[int, int, Number] | None:
+    """The opcode, slot and value of a jump that does the test of an if by
+    itself, when it compares a variable of the innermost frame with a number."""
+    if not (isinstance(test, List) and len(test) == 3):
+        return None
+    head, var, value = test
+    if not (
+        isinstance(head, Symbol)
+        and head in _COMPARE_JUMPS
+        and _resolve(head, scopes) is None
+        and isinstance(var, Symbol)
+        and isinstance(value, Number)
+    ):
+        return None
+    address = _resolve(var, scopes)
+    if address is None or address[0] != 0:
+        return None
+    return _COMPARE_JUMPS[head], address[1], value
+
+
+def _compile_define(x: list, code: Code, scopes: list[Scope], tail: bool) -> None:
+    "(define var exp) or (define-memo var proc)"
+    head, var, exp = x
+    _compile(exp, code, scopes)
+    if head == _define_memo:
+        code.append((MEMOIZE, None))
+    if scopes:  # an internal define gets a slot in its lambda's frame
+        scope = scopes[-1]
+        code.append((STORE_LOCAL, (0, scope.setdefault(var, len(scope)))))
+    else:
+        _check_redefinition(var)
+        code.append((DEFINE, _global_id(var)))
+
+
+def _check_redefinition(var: str) -> None:
+    "Raise SyntaxError if var is a standard operator that the compiler integrates."
+    if var in _OPERATORS:
+        raise SyntaxError(f"cannot redefine '{var}', which is compiled in place")
+
+
+def _compile_set(x: list, code: Code, scopes: list[Scope], tail: bool) -> None:
+    "(set! var exp)"
+    _, var, exp = x
+    _compile(exp, code, scopes)
+    address = _resolve(var, scopes)
+    if address is None:
+        _check_redefinition(var)
+        code.append((STORE_GLOBAL, _global_id(var)))
+    else:
+        code.append((STORE_LOCAL, address))
+
+
+def _compile_lambda(x: list, code: Code, scopes: list[Scope], tail: bool) -> None:
+    "(lambda (var...) body)"
+    _, parms, body = x
+    scope = {var: i for i, var in enumerate(parms)}
+    _scan_defines(body, scope)  # so the body can refer to them before they run
+    lam = Lambda(parms, body, compile(body, [*scopes, scope]), len(scope))
+    code.append((MAKE_CLOSURE, lam))
+
+
+def _scan_defines(x: Any, scope: Scope) -> None:
+    "Give a slot in scope to each variable that the lambda body x defines."
+    if not isinstance(x, List) or not x:
+        return
+    head = x[0]
+    if head in (_quote, _lambda):  # a nested lambda defines in its own frame
+        return
+    if head in (_define, _define_memo) and len(x) == 3:
+        scope.setdefault(x[1], len(scope))
+    for e in x:
+        _scan_defines(e, scope)
+
+
+# The compiler of each special form, by keyword
+_SPECIAL_FORMS = {
+    _quote: _compile_quote,
+    _if: _compile_if,
+    _define: _compile_define,
+    _define_memo: _compile_define,
+    _set: _compile_set,
+    _lambda: _compile_lambda,
+}
+
+
+################ eval
+
+
+def eval(x: Any, env: GlobalEnv) -> Any:
+    "Evaluate an expression in a global environment."
+    return _execute(compile(x), None, env.slots)
+
+
+class CompiledExpr:
+    "The bytecode of an expression, prepared once to be run any number of times."
+
+    __slots__ = ("source", "code")
+
+    def __init__(self, source: str, code: Code):
+        self.source = source
+        self.code = code
+
+
+def prepare(source: str) -> CompiledExpr:
+    "Tokenize, parse and compile the source of an expression, for run."
+    return CompiledExpr(source, compile(parse(source)))
+
+
+def run(expr: "str | CompiledExpr", env: GlobalEnv) -> Any:
+    """Evaluate a prepared expression, or the source of one, in a global
+    environment. Global names are numbered alike in every environment, so
+    one CompiledExpr can be run in any of them."""
+    if isinstance(expr, str):
+        expr = prepare(expr)
+    return _execute(expr.code, None, env.slots)
+
+
+def _execute(
+    code: Code,
+    frame: Frame | None,
+    genv: list,
+    *,
+    # The opcodes are bound as defaults so that each comparison in the
+    # dispatch below reads a fast local rather than a module global.
+    CONST=CONST,
+    LOAD_LOCAL=LOAD_LOCAL,
+    LOAD_GLOBAL=LOAD_GLOBAL,
+    STORE_LOCAL=STORE_LOCAL,
+    STORE_GLOBAL=STORE_GLOBAL,
+    DEFINE=DEFINE,
+    JUMP_IF_FALSE=JUMP_IF_FALSE,
+    JUMP=JUMP,
+    CALL=CALL,
+    MAKE_CLOSURE=MAKE_CLOSURE,
+    RETURN=RETURN,
+    MEMOIZE=MEMOIZE,
+    CALL_PROC=CALL_PROC,
+    CALL_BUILTIN=CALL_BUILTIN,
+    CALL_BUILTIN_1=CALL_BUILTIN_1,
+    CALL_BUILTIN_2=CALL_BUILTIN_2,
+    TAIL_CALL=TAIL_CALL,
+    BINARY_ADD=BINARY_ADD,
+    BINARY_SUB=BINARY_SUB,
+    BINARY_MUL=BINARY_MUL,
+    BINARY_DIV=BINARY_DIV,
+    JUMP_IF_NOT_LT=JUMP_IF_NOT_LT,
+    JUMP_IF_NOT_GT=JUMP_IF_NOT_GT,
+    JUMP_IF_NOT_LE=JUMP_IF_NOT_LE,
+    JUMP_IF_NOT_GE=JUMP_IF_NOT_GE,
+    JUMP_IF_NOT_EQ=JUMP_IF_NOT_EQ,
+    # So are the builtins and globals that the loop uses on every call.
+    Procedure=Procedure,
+    _UNBOUND=_UNBOUND,
+    len=len,
+    type=type,
+) -> Any:
+    """Run compiled code in a local frame and the slots of a global environment;
+    return its value.
+    Calls to Procedures run in this same loop: the caller's state is saved on
+    a call stack rather than in a nested Python call."""
+    stack: list = []
+    push = stack.append
+    pop = stack.pop
+    # The (code, pc, frame, genv, proc, memo) of each caller, where memo is the
+    # (cache, key) to store the value returned to it under, or None
+    calls: list[tuple] = []
+    proc = None  # the Procedure whose code is running, if called in place
+    pc = 0
+    while True:
+        op, arg = code[pc]
+        pc += 1
+        if op == LOAD_LOCAL:
+            depth, i = arg
+            f = frame
+            while depth:
+                f = f.outer
+                depth -= 1
+            push(f.slots[i])
+        elif op == LOAD_GLOBAL:
+            try:
+                value = genv[arg]
+            except IndexError:  # numbered after every name defined in this env
+                value = _UNBOUND
+            if value is _UNBOUND:
+                raise NameError(f"Variable '{_global_names[arg]}' not found")
+            push(value)
+        elif op == CONST:
+            push(arg)
+        elif op == BINARY_ADD:
+            y = pop()
+            stack[-1] = stack[-1] + y
+        elif op == BINARY_SUB:
+            y = pop()
+            stack[-1] = stack[-1] - y
+        elif op == BINARY_MUL:
+            y = pop()
+            stack[-1] = stack[-1] * y
+        elif op == CALL_PROC:
+            n = len(stack) - arg
+            callee = stack[n - 1]
+            if type(callee) is Procedure and (
+                callee.jit is None or _depth >= JIT_MAX_DEPTH
+            ):
+                memo = None
+                if callee.cache is not None:  # memoized: look the value up first
+                    key, value = _memo_lookup(callee.cache, stack[n:])
+                    if value is not _MISS:
+                        del stack[n:]
+                        stack[-1] = value
+                        continue
+                    if key is not None:
+                        memo = (callee.cache, key)
+                callee.ncalls += 1
+                if callee.ncalls == JIT_THRESHOLD:
+                    callee.jit = _jit(callee)
+                new_frame = callee._frame(stack[n:])
+                del stack[n - 1 :]
+                calls.append((code, pc, frame, genv, proc, memo))
+                code = callee.lam.code
+                pc = 0
+                frame = new_frame
+                genv = callee.genv
+                proc = callee
+            else:
+                args = stack[n:]
+                del stack[n:]
+                stack[-1] = callee(*args)
+        elif op == TAIL_CALL:
+            n = len(stack) - arg
+            callee = stack[n - 1]
+            if type(callee) is Procedure and (
+                callee.jit is None or _depth >= JIT_MAX_DEPTH
+            ):
+                memo = None
+                if callee.cache is not None:
+                    key, value = _memo_lookup(callee.cache, stack[n:])
+                    if value is not _MISS:
+                        del stack[n:]
+                        stack[-1] = value
+                        continue
+                    if key is not None:
+                        memo = (callee.cache, key)
+                callee.ncalls += 1
+                if callee.ncalls == JIT_THRESHOLD:
+                    callee.jit = _jit(callee)
+                if memo is not None:  # a call, not a jump, to store its value
+                    new_frame = callee._frame(stack[n:])
+                    calls.append((code, pc, frame, genv, proc, memo))
+                    frame = new_frame
+                else:
+                    if proc is not None and proc.lam.leaf:  # the frame is done
+                        proc._release(frame)
+                    frame = callee._frame(stack[n:])  # a self call reuses it
+                del stack[n - 1 :]
+                code = callee.lam.code
+                pc = 0
+                genv = callee.genv
+                proc = callee
+            else:
+                args = stack[n:]
+                del stack[n:]
+                stack[-1] = callee(*args)
+        elif op == CALL_BUILTIN_1:
+            if type(stack[-2]) is Procedure:  # run it in place from now on
+                code[pc - 1] = (CALL_PROC, arg)
+                pc -= 1
+            else:
+                x = pop()
+                stack[-1] = stack[-1](x)
+        elif op == CALL_BUILTIN_2:
+            if type(stack[-3]) is Procedure:
+                code[pc - 1] = (CALL_PROC, arg)
+                pc -= 1
+            else:
+                y = pop()
+                x = pop()
+                stack[-1] = stack[-1](x, y)
+        elif op == JUMP_IF_NOT_LE:
+            i, value, target = arg
+            if not frame.slots[i] <= value:
+                pc = target
+        elif op == JUMP_IF_NOT_EQ:
+            i, value, target = arg
+            if not frame.slots[i] == value:
+                pc = target
+        elif op == JUMP_IF_NOT_LT:
+            i, value, target = arg
+            if not frame.slots[i] < value:
+                pc = target
+        elif op == JUMP_IF_NOT_GT:
+            i, value, target = arg
+            if not frame.slots[i] > value:
+                pc = target
+        elif op == JUMP_IF_NOT_GE:
+            i, value, target = arg
+            if not frame.slots[i] >= value:
+                pc = target
+        elif op == JUMP_IF_FALSE:
+            if not pop():
+                pc = arg
+        elif op == JUMP:
+            pc = arg
+        elif op == RETURN:  # the return value stays on top of the stack
+            if proc is not None and proc.lam.leaf:  # no closure has the frame
+                proc._release(frame)
+            if not calls:
+                return pop()
+            code, pc, frame, genv, proc, memo = calls.pop()
+            if memo is not None:
+                cache, key = memo
+                cache[key] = stack[-1]
+        elif op == BINARY_DIV:
+            y = pop()
+            stack[-1] = stack[-1] / y
+        elif op == CALL_BUILTIN:
+            n = len(stack) - arg
+            if type(stack[n - 1]) is Procedure:
+                code[pc - 1] = (CALL_PROC, arg)
+                pc -= 1
+            else:
+                args = stack[n:]
+                del stack[n:]
+                stack[-1] = stack[-1](*args)
+        elif op == CALL:
+            callee = stack[-arg - 1]
+            if type(callee) is Procedure:
+                code[pc - 1] = (CALL_PROC, arg)
+            elif arg == 1:
+                code[pc - 1] = (CALL_BUILTIN_1, arg)
+            elif arg == 2:
+                code[pc - 1] = (CALL_BUILTIN_2, arg)
+            else:
+                code[pc - 1] = (CALL_BUILTIN, arg)
+            pc -= 1  # run the specialized instruction
+        elif op == MAKE_CLOSURE:
+            push(Procedure(arg, frame, genv))
+        elif op == DEFINE:
+            if arg >= len(genv):
+                genv.extend([_UNBOUND] * (arg + 1 - len(genv)))
+            genv[arg] = stack[-1]
+            stack[-1] = None
+        elif op == STORE_LOCAL:
+            depth, i = arg
+            f = frame
+            while depth:
+                f = f.outer
+                depth -= 1
+            f.slots[i] = stack[-1]
+            stack[-1] = None
+        elif op == STORE_GLOBAL:
+            if arg >= len(genv) or genv[arg] is _UNBOUND:
+                raise NameError(f"Variable '{_global_names[arg]}' not found")
+            genv[arg] = stack[-1]
+            stack[-1] = None
+        elif op == MEMOIZE:
+            memo = stack[-1]
+            if not isinstance(memo, Procedure):
+                raise TypeError(f"define-memo needs a procedure, not '{memo}'")
+            memo = stack[-1] = Procedure(memo.lam, memo.env, memo.genv)
+            memo.cache = {}  # on a copy, so other names for memo stay uncached
+        else:
+            raise SystemError(f"unknown opcode {op}")
+
+
+################ JIT: compile hot procedures to Python
+
+
+class _NotCompilable(Exception):
+    "Raised for procedures that _jit leaves to the interpreter."
+
+
+def _jit(proc: Procedure) -> Callable | None:
+    """Compile a Procedure to an equivalent Python function, or return None.
+    Only procedures whose bodies are made of constants, if, calls, their own
+    parameters and defined globals are compiled."""
+    lam = proc.lam
+    for op, arg in lam.code:
+        if op in (STORE_LOCAL, STORE_GLOBAL, DEFINE, MAKE_CLOSURE, MEMOIZE) or (
+            op == LOAD_LOCAL and arg[0] != 0
+        ):
+            return None
+    parms = {var: f"_a{i}" for i, var in enumerate(lam.parms)}
+    consts: list = []
+    try:
+        expr = _py_expr(lam.body, parms, proc.genv, consts)
+        source = f"def _p({', '.join(parms.values())}):\n    return {expr}\n"
+        code = builtins.compile(source, "<lis jit>", "exec")
+    except _NotCompilable:
+        return None
+    except (SyntaxError, RecursionError, MemoryError):  # nested too deeply for Python
+        return None
+    namespace = {"_g": proc.genv, "_k": consts}
+    exec(code, namespace)
+    return namespace["_p"]
+
+
+def _py_expr(x: Any, parms: dict[str, str], genv: list, consts: list) -> str:
+    "The source of a Python expression that computes the value of x."
+    if isinstance(x, Symbol):
+        if x in parms:
+            return parms[x]
+        i = _global_id(x)
+        if i >= len(genv) or genv[i] is _UNBOUND:  # let the interpreter raise
+            raise _NotCompilable(x)
+        return f"_g[{i}]"  # it stays bound, as globals are never unbound
+    elif not isinstance(x, List):
+        if type(x) is int:
+            return repr(x)
+        consts.append(x)
+        return f"_k[{len(consts) - 1}]"
+    elif not x:
+        raise _NotCompilable(x)
+    head = x[0]
+    if head == _quote:  # (quote exp)
+        _, exp = x
+        consts.append(quoted(exp))
+        return f"_k[{len(consts) - 1}]"
+    elif head == _if:  # (if test conseq alt)
+        test, conseq, alt = (_py_expr(e, parms, genv, consts) for e in x[1:])
+        return f"({conseq} if {test} else {alt})"
+    elif head in (_define, _define_memo, _set, _lambda) or not isinstance(
+        head, (Symbol, List)
+    ):
+        raise _NotCompilable(head)
+    args = [_py_expr(e, parms, genv, consts) for e in x[1:]]
+    if isinstance(head, Symbol) and head in _OPERATORS and head not in parms:
+        operator, nargs, _, _ = _OPERATORS[head]
+        if len(args) in nargs:
+            return "(" + f" {operator} ".join(args) + ")"
+    return f"{_py_expr(head, parms, genv, consts)}({', '.join(args)})"
+
+
+################ Vectorized map: run arithmetic procedures over lists with NumPy
+
+VECTOR_THRESHOLD = 32  # The shortest list that map hands to NumPy
+_EXACT = 2**53  # Magnitudes below this are exact as int64 and as float64
+# The opcodes of a body of integrated +, - and * of its parameter and numbers
+_VECTOR_OPS = {CONST, LOAD_LOCAL, BINARY_ADD, BINARY_SUB, BINARY_MUL, RETURN}
+
+
+def _vector_map(proc: Any, lst: Any) -> Pair | Nil | None:
+    """The value of (map proc lst) computed by NumPy, or None if it cannot be.
+    proc must be a one-parameter Procedure whose body is +, - and * of its
+    parameter and numbers, and lst a long list of all ints or all floats.
+    For ints, the items and results must provably be exact in int64."""
+    if np is None or type(proc) is not Procedure or proc.cache is not None:
+        return None
+    lam = proc.lam
+    if len(lam.parms) != 1 or not isinstance(lst, Pair):
+        return None
+    var = lam.parms[0]
+    for op, arg in lam.code:  # operators bound by a caller compile to calls
+        if op not in _VECTOR_OPS or (op == LOAD_LOCAL and arg[0] != 0):
+            return None
+    if not _is_arithmetic(lam.body, var):
+        return None
+    items = list(lst)
+    if len(items) < VECTOR_THRESHOLD:
+        return None
+    kind = type(items[0])
+    if kind not in (int, float) or any(type(x) is not kind for x in items):
+        return None
+    if kind is int:
+        if any(abs(x) >= _EXACT for x in items):
+            return None
+        magnitudes = np.abs(np.array(items, dtype=np.float64))
+        if not np.all(_array_eval(lam.body, var, magnitudes, bound=True) < _EXACT):
+            return None
+    array = np.array(items, dtype=np.int64 if kind is int else np.float64)
+    result = _array_eval(lam.body, var, array)
+    return make_list(np.broadcast_to(result, array.shape).tolist())
+
+
+def _is_arithmetic(x: Any, var: str) -> bool:
+    "Is x made only of +, - and * applied to var and numbers?"
+    if isinstance(x, Symbol):
+        return x == var
+    elif not isinstance(x, List):
+        return type(x) is float or (type(x) is int and abs(x) < _EXACT)
+    return (
+        len(x) > 1
+        and x[0] in ("+", "-", "*")
+        and x[0] != var
+        and len(x) - 1 in _OPERATORS[x[0]][1]
+        and all(_is_arithmetic(e, var) for e in x[1:])
+    )
+
+
+def _array_eval(x: Any, var: str, array: Any, bound: bool = False) -> Any:
+    """Evaluate an arithmetic expression with var bound to an array.
+    With bound, array holds magnitudes and the result bounds those of x."""
+    if isinstance(x, Symbol):
+        return array
+    elif not isinstance(x, List):
+        return abs(x) if bound else x
+    head, *args = x
+    result, *rest = (_array_eval(e, var, array, bound) for e in args)
+    for value in rest:
+        if head == "*":
+            result = result * value
+        elif head == "+" or bound:  # |a - b| <= |a| + |b|
+            result = result + value
+        else:
+            result = result - value
+    return result
 
 
 ################ Main execution
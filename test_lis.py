@@ -19,9 +19,9 @@ def env():
     return lis.standard_env()
 
 
-def lisp_eval(expression: str, env):
-    """Helper function to parse and evaluate a Lisp expression."""
-    return lis.eval(lis.parse(expression), env)
+def lisp_eval(expression: "str | lis.CompiledExpr", env):
+    """Helper function to evaluate a Lisp expression, from source or prepared."""
+    return lis.run(expression, env)
 
 
 def test_basic_arithmetic(env):
@@ -101,6 +101,9 @@ def test_lambda_functions(env):
     # Direct lambda invocation
     assert lisp_eval("((lambda (x) (* x 2)) 6)", env) == 12
 
+    # Procedures have no per-instance __dict__
+    assert not hasattr(env["square"], "__dict__")
+
 
 def test_recursive_functions(env):
     """Test recursive function definitions."""
@@ -132,6 +135,216 @@ def test_recursive_functions(env):
     assert lisp_eval("(fib 6)", env) == 8
 
 
+def test_frame_reuse(env):
+    """Test that frames of returned calls are recycled only when safe."""
+    lisp_eval("(define fact (lambda (n) (if (<= n 1) 1 (* n (fact (- n 1))))))", env)
+    assert lisp_eval("(fact 3)", env) == 6
+    assert len(env["fact"]._pool) == 3  # one frame per level of recursion
+    assert lisp_eval("(fact 4)", env) == 24
+    assert len(env["fact"]._pool) == 4
+
+    # The pool is bounded, and pooled frames hold no values of their calls
+    lisp_eval(
+        "(define count (lambda (n x) (if (= n 0) 0 (+ 1 (count (- n 1) x)))))", env
+    )
+    lisp_eval("(define big (list 1 2 3))", env)
+    assert lisp_eval("(count 50 big)", env) == 50
+    pool = env["count"]._pool
+    assert len(pool) == lis.POOL_SIZE
+    assert all(slot is None for frame in pool for slot in frame.slots)
+
+    # Frames captured by closures are never reused
+    lisp_eval("(define adder (lambda (x) (lambda (y) (+ x y))))", env)
+    lisp_eval("(define add5 (adder 5))", env)
+    lisp_eval("(define add7 (adder 7))", env)
+    assert env["adder"]._pool == []
+    assert lisp_eval("(add5 1)", env) == 6
+
+
+def test_call_specialization(env, monkeypatch):
+    """Test that call sites specialize on the kind of procedure they call."""
+    lisp_eval("(define square (lambda (x) (* x x)))", env)
+    code = lis.compile(lis.parse("(+ (square 3) (abs -4) (max 1 2))"))
+    assert lis._execute(code, None, env.slots) == 15
+    ops = [op for op, _ in code]
+    assert lis.CALL not in ops
+    assert lis.CALL_PROC in ops
+    assert lis.CALL_BUILTIN_1 in ops
+    assert lis.CALL_BUILTIN_2 in ops
+
+    # A specialized call site still works when its callee changes kind
+    lisp_eval("(define twice (lambda (f x) (f (f x))))", env)
+    assert lisp_eval("(twice square 3)", env) == 81
+    assert lisp_eval("(twice abs -3)", env) == 3
+    assert lisp_eval("(twice square 2)", env) == 16
+
+    # Procedure calls do not nest Python calls, so recursion can go deep
+    lisp_eval("(define count (lambda (n) (if (= n 0) 0 (+ 1 (count (- n 1))))))", env)
+    assert lisp_eval("(count 10000)", env) == 10000
+
+    # So can recursion through a call site that first called a builtin
+    monkeypatch.setattr(lis, "JIT_THRESHOLD", 10**9)  # run in the interpreter
+    for builtin, parms in [("abs", "n"), ("max", "n a"), ("max", "n a b")]:
+        zeros = " 0" * (len(parms.split()) - 1)
+        lisp_eval(f"(define call (lambda (f {parms}) (+ 0 (f {parms}))))", env)
+        lisp_eval(f"(call {builtin} -1{zeros})", env)
+        lisp_eval(
+            f"(define down (lambda ({parms}) (if (= n 0) 0 (call down (- n 1){zeros}))))",
+            env,
+        )
+        assert lisp_eval(f"(down 5000{zeros})", env) == 0
+
+
+def test_tail_calls(env, monkeypatch):
+    """Test that calls in tail position do not grow the call stack."""
+    code = lis.compile(lis.parse("(lambda (n) (if n (f n) (g (h n))))"))
+    ops = [op for op, _ in code[0][1].code]
+    assert ops.count(lis.TAIL_CALL) == 2  # (f n) and (g (h n))
+    assert ops.count(lis.CALL) == 1  # (h n)
+
+    monkeypatch.setattr(lis, "JIT_THRESHOLD", 10**9)  # keep it interpreted
+    lisp_eval(
+        """
+        (define loop
+            (lambda (n acc) (if (= n 0) acc (loop (- n 1) (+ acc 1)))))
+    """,
+        env,
+    )
+    assert lisp_eval("(loop 100000 0)", env) == 100000
+    assert len(env["loop"]._pool) == 1  # one frame, rebound for each call
+
+    # Mutual recursion in tail position
+    lisp_eval("(define even? (lambda (n) (if (= n 0) 1 (odd? (- n 1)))))", env)
+    lisp_eval("(define odd? (lambda (n) (if (= n 0) 0 (even? (- n 1)))))", env)
+    assert lisp_eval("(even? 100001)", env) == 0
+    assert len(env["even?"]._pool) == 1
+
+
+def test_jit(env):
+    """Test that hot procedures are compiled to Python functions."""
+    lisp_eval(
+        """
+        (define fib
+            (lambda (n)
+                (if (<= n 1)
+                    n
+                    (+ (fib (- n 1)) (fib (- n 2))))))
+    """,
+        env,
+    )
+    assert lisp_eval("(fib 3)", env) == 2
+    assert env["fib"].jit is None
+    assert lisp_eval("(fib 15)", env) == 610
+    assert env["fib"].jit is not None
+    assert env["fib"].jit(20) == 6765
+
+    # Compiled code sees later definitions of the globals it calls
+    lisp_eval("(define inc (lambda (x) (+ x 1)))", env)
+    lisp_eval("(define f (lambda (x) (inc (car (quote (1.5))))))", env)
+    for _ in range(lis.JIT_THRESHOLD):
+        assert lisp_eval("(f 0)", env) == 2.5
+    assert env["f"].jit is not None
+    lisp_eval("(define inc (lambda (x) (- x 1)))", env)
+    assert lisp_eval("(f 0)", env) == 0.5
+
+    # Locally bound operator names are not integrated
+    lisp_eval("(define g (lambda (+ x) (+ x x)))", env)
+    for _ in range(lis.JIT_THRESHOLD):
+        lisp_eval("(g * 3)", env)
+    assert env["g"].jit is not None
+    assert lisp_eval("(g * 3)", env) == 9
+
+    # Bodies nested too deeply for Python's compiler stay interpreted
+    body = "(+ 1 " * 300 + "x" + ")" * 300
+    lisp_eval(f"(define deep (lambda (x) {body}))", env)
+    for _ in range(lis.JIT_THRESHOLD + 1):
+        assert lisp_eval("(deep 0)", env) == 300
+    assert env["deep"].jit is None
+
+    # Procedures with side effects or closures stay interpreted
+    lisp_eval("(define n 0)", env)
+    lisp_eval("(define bump (lambda () (set! n (+ n 1))))", env)
+    lisp_eval("(define adder (lambda (x) (lambda (y) (+ x y))))", env)
+    for _ in range(2 * lis.JIT_THRESHOLD):
+        lisp_eval("(bump)", env)
+        lisp_eval("(adder 1)", env)
+    assert env["bump"].jit is None and env["adder"].jit is None
+    assert lisp_eval("n", env) == 2 * lis.JIT_THRESHOLD
+
+    # Deep recursion of compiled procedures continues in the interpreter
+    lisp_eval("(define count (lambda (n) (if (= n 0) 0 (+ 1 (count (- n 1))))))", env)
+    assert lisp_eval("(count 20)", env) == 20
+    assert env["count"].jit is not None
+    assert lisp_eval("(count 10000)", env) == 10000
+
+    # So does recursion through a procedure that is not compiled
+    lisp_eval("(define g (lambda (k) (begin (set! n (+ n 1)) (f k))))", env)
+    lisp_eval("(define f (lambda (k) (if (= k 0) 0 (+ 1 (g (- k 1))))))", env)
+    for _ in range(lis.JIT_THRESHOLD):
+        lisp_eval("(f 1)", env)
+    assert env["f"].jit is not None and env["g"].jit is None
+    assert lisp_eval("(f 5000)", env) == 5000
+
+
+def test_define_memo(env):
+    """Test memoized procedure definitions."""
+    lisp_eval(
+        """
+        (define-memo fib
+            (lambda (n)
+                (if (<= n 1)
+                    n
+                    (+ (fib (- n 1)) (fib (- n 2))))))
+    """,
+        env,
+    )
+    assert lisp_eval("(fib 80)", env) == 23416728348467685  # linear, not exponential
+    assert len(env["fib"].cache) == 81
+
+    # Memoized recursion runs in place too, so it can go deep
+    lisp_eval(
+        "(define-memo fib2 (lambda (n) (if (<= n 1) n (+ (fib2 (- n 1)) (fib2 (- n 2))))))",
+        env,
+    )
+    a, b = 0, 1
+    for _ in range(3000):
+        a, b = b, a + b
+    assert lisp_eval("(fib2 3000)", env) == a
+    lisp_eval("(define-memo down (lambda (n) (if (= n 0) 0 (down (- n 1)))))", env)
+    assert lisp_eval("(down 5000)", env) == 0
+    assert len(env["down"].cache) == 5001  # tail calls store their values too
+
+    # Plain define does not memoize
+    lisp_eval("(define calls 0)", env)
+    lisp_eval("(define f (lambda (x) (begin (set! calls (+ calls 1)) x)))", env)
+    lisp_eval("(f 1)", env)
+    lisp_eval("(f 1)", env)
+    assert lisp_eval("calls", env) == 2
+    assert env["f"].cache is None
+
+    # Memoizing an existing procedure leaves that one uncached
+    lisp_eval("(define-memo g f)", env)
+    lisp_eval("(g 1)", env)
+    lisp_eval("(g 1)", env)
+    assert lisp_eval("calls", env) == 3
+    lisp_eval("(f 1)", env)
+    lisp_eval("(f 1)", env)
+    assert lisp_eval("calls", env) == 5
+    assert env["f"].cache is None and env["g"] is not env["f"]
+
+    # Arguments that are equal but of different types are cached apart
+    lisp_eval("(define-memo sq (lambda (x) (* x x)))", env)
+    assert type(lisp_eval("(sq 2)", env)) is int
+    assert type(lisp_eval("(sq 2.0)", env)) is float
+
+    # Unhashable arguments are passed through uncached
+    lisp_eval("(define-memo len (lambda (lst) (length lst)))", env)
+    assert lisp_eval("(len (quote (1 2 3)))", env) == 3
+
+    with pytest.raises(TypeError):
+        lisp_eval("(define-memo abs2 abs)", env)
+
+
 def test_list_operations(env):
     """Test list manipulation functions."""
     # car (first element)
@@ -153,6 +366,42 @@ def test_list_operations(env):
     assert lisp_eval("(append (quote (1 2)) (quote (3 4)))", env) == [1, 2, 3, 4]
 
 
+def test_pairs(env):
+    """Test that lists are chains of pairs sharing their tails."""
+    lisp_eval("(define lst (quote (1 2 3)))", env)
+    lst = env["lst"]
+    assert isinstance(lst, lis.Pair)
+    assert lisp_eval("(cdr lst)", env) is lst.cdr  # no copy
+    assert lisp_eval("(cons 0 lst)", env).cdr is lst
+    assert lisp_eval("(append (quote (0)) lst)", env).cdr is lst
+    assert lisp_eval("(cdr (cdr (cdr lst)))", env) is lis.nil
+
+    # Nested quoted lists become nested pairs
+    assert lisp_eval("(car (cdr (quote (1 (2 3)))))", env) == [2, 3]
+    assert lisp_eval("(equal? (quote (1 (2 3))) (list 1 (list 2 3)))", env) is True
+    assert lisp_eval("(equal? (quote (1 2)) (quote (1 2 3)))", env) is False
+    assert lisp_eval("(eq? (quote ()) (cdr (list 1)))", env) is True
+
+    # Improper lists
+    assert lis.lispstr(lisp_eval("(cons 1 2)", env)) == "(1 . 2)"
+    assert lisp_eval("(cons 1 2)", env) != [1]
+
+    # Linear-time list building and walking
+    lisp_eval(
+        """
+        (define iota
+            (lambda (n acc) (if (= n 0) acc (iota (- n 1) (cons n acc)))))
+    """,
+        env,
+    )
+    lisp_eval(
+        "(define sum (lambda (lst) (if (null? lst) 0 (+ (car lst) (sum (cdr lst))))))",
+        env,
+    )
+    assert lisp_eval("(sum (iota 5000 (quote ())))", env) == 5000 * 5001 // 2
+    assert lisp_eval("(length (iota 5000 (quote ())))", env) == 5000
+
+
 def test_predicates(env):
     """Test predicate functions."""
     # number?
@@ -220,6 +469,36 @@ def test_map_function(env):
     assert result == [1, 4, 9, 16]
 
 
+def test_vectorized_map(env, monkeypatch):
+    """Test that map over long numeric lists agrees with calling the procedure."""
+    numbers = " ".join(str(x) for x in range(-50, 50))
+    lisp_eval(f"(define ints (quote ({numbers})))", env)
+    lisp_eval("(define floats (map (lambda (x) (/ x 4)) ints))", env)
+    lisp_eval("(define f (lambda (x) (- (* x x 3) (+ x 1))))", env)
+    lisp_eval("(define big (lambda (x) (* x x x x 100000000000)))", env)
+    lisp_eval("(define mixed (cons 1.5 (cdr ints)))", env)
+    huge = " ".join(str(2**63 + x) for x in range(40))
+    lisp_eval(f"(define huge (quote ({huge})))", env)
+    calls = [
+        "(map f ints)",
+        "(map f floats)",
+        "(map big ints)",
+        "(map f mixed)",
+        "(map (lambda (x) (* x 0)) huge)",  # items too large for int64
+        "((lambda (+) (map (lambda (x) (+ x 1)) ints)) *)",  # + bound by a caller
+    ]
+
+    with_numpy = [list(lisp_eval(call, env)) for call in calls]
+    monkeypatch.setattr(lis, "np", None)
+    without_numpy = [list(lisp_eval(call, env)) for call in calls]
+    for a, b in zip(with_numpy, without_numpy):
+        assert a == b
+        assert [type(x) for x in a] == [type(x) for x in b]
+    assert with_numpy[0][:3] == [7549, 7251, 6959]
+    assert with_numpy[2][0] == 50**4 * 100000000000  # too large for int64
+    assert with_numpy[5][:3] == [-50, -49, -48]
+
+
 def test_complex_expressions(env):
     """Test more complex expressions combining multiple features."""
     # Define a function that uses conditionals and recursion
@@ -263,6 +542,10 @@ def test_error_handling(env):
     # Syntax error
     with pytest.raises(SyntaxError):
         lis.parse("(+ 1 2")  # Missing closing parenthesis
+    with pytest.raises(SyntaxError):
+        lis.parse(")")
+    with pytest.raises(SyntaxError):
+        lis.parse("")
 
 
 def test_parsing():
@@ -270,15 +553,260 @@ def test_parsing():
     # Test tokenization
     tokens = lis.tokenize("(+ 1 2)")
     assert tokens == ["(", "+", "1", "2", ")"]
+    assert lis.tokenize(" (f(g x)\n\ty)) ") == "( f ( g x ) y ) )".split()
+    assert lis.tokenize("") == []
 
     # Test parsing
     parsed = lis.parse("(+ 1 2)")
     assert parsed == ["+", 1, 2]
 
+    # Test nested and deeply nested parsing
+    assert lis.parse("(a (b (c)) () d)") == ["a", ["b", ["c"]], [], "d"]
+    deep = "(" * 5000 + ")" * 5000
+    assert lis.parse(deep) is not None
+
+    # Reading consumes only the first expression
+    tokens = lis.tokenize("(+ 1 2) (* 3 4)")
+    assert lis.read_from_tokens(tokens) == ["+", 1, 2]
+    assert tokens == ["(", "*", "3", "4", ")"]
+
     # Test atom parsing
     assert lis.atom("42") == 42
     assert lis.atom("3.14") == 3.14
     assert lis.atom("hello") == "hello"
+    assert lis.atom("-7") == -7
+    assert lis.atom("+7") == 7
+    assert lis.atom("-.5") == -0.5
+    assert lis.atom("1e3") == 1000.0
+    assert lis.atom("-") == "-"
+    assert lis.atom("1+") == "1+"
+    assert lis.atom("...") == "..."
+
+    # Symbols are interned, including ones that are not identifiers
+    assert lis.atom("set!") is lis.atom("".join(["set", "!"]))
+    assert lis.parse("(f long-name)")[1] is lis.parse("(g long-name)")[1]
+
+
+def test_prepare(env):
+    """Test running a prepared expression repeatedly and in other environments."""
+    expr = lis.prepare("(begin (define n (+ n 1)) n)")
+    assert expr.source == "(begin (define n (+ n 1)) n)"
+    lisp_eval("(define n 0)", env)
+    assert [lisp_eval(expr, env) for _ in range(3)] == [1, 2, 3]
+
+    other = lis.standard_env()
+    lisp_eval("(define n 10)", other)
+    assert lisp_eval(expr, other) == 11 and lisp_eval("n", env) == 3
+
+    with pytest.raises(SyntaxError):
+        lis.prepare("(+ 1")
+
+
+def test_compile():
+    """Test compiling expressions to bytecode."""
+    assert lis.compile(42) == [(lis.CONST, 42), (lis.RETURN, None)]
+
+    code = lis.compile(lis.parse("(if x 1 2)"))
+    assert code == [
+        (lis.LOAD_GLOBAL, lis._global_id("x")),
+        (lis.JUMP_IF_FALSE, 4),
+        (lis.CONST, 1),
+        (lis.JUMP, 5),
+        (lis.CONST, 2),
+        (lis.RETURN, None),
+    ]
+
+    # Compiled code can be run more than once
+    code = lis.compile(lis.parse("(* 6 7)"))
+    assert lis._execute(code, None, lis.standard_env().slots) == 42
+
+
+def test_constant_folding(env):
+    """Test that operators on constants are computed at compile time."""
+    code = lis.compile(lis.parse("(* 3.5 (+ 1 2 (- 10 4)))"))
+    assert code == [(lis.CONST, 31.5), (lis.RETURN, None)]
+
+    code = lis.compile(lis.parse("(if (< 1 2) (quote yes) x)"))
+    assert code == [(lis.CONST, "yes"), (lis.RETURN, None)]
+    code = lis.compile(lis.parse("(if (quote ()) x (+ 1 1))"))
+    assert code == [(lis.CONST, 2), (lis.RETURN, None)]
+
+    # Operands that are not constants are left alone
+    code = lis.compile(lis.parse("(+ x (* 2 3))"))
+    assert code[:3] == [
+        (lis.LOAD_GLOBAL, lis._global_id("x")),
+        (lis.CONST, 6),
+        (lis.BINARY_ADD, None),
+    ]
+
+    # Locally bound operator names, and errors, are left to run time
+    assert lisp_eval("((lambda (+) (+ 2 3)) *)", env) == 6
+    assert lis.compile(lis.parse("(/ 1 0)"))[-2] == (lis.BINARY_DIV, None)
+    with pytest.raises(ZeroDivisionError):
+        lisp_eval("(/ 1 0)", env)
+
+
+def test_binary_operators(env):
+    """Test that arithmetic compiles to opcodes folding left over the arguments."""
+    code = lis.compile(lis.parse("(* a b c)"))
+    assert code == [
+        (lis.LOAD_GLOBAL, lis._global_id("a")),
+        (lis.LOAD_GLOBAL, lis._global_id("b")),
+        (lis.BINARY_MUL, None),
+        (lis.LOAD_GLOBAL, lis._global_id("c")),
+        (lis.BINARY_MUL, None),
+        (lis.RETURN, None),
+    ]
+    lisp_eval("(define x 1.0)", env)
+    assert lisp_eval("(+ x 1e16 -1e16 1)", env) == 1.0  # ((x + 1e16) - 1e16) + 1
+    for args in ["x 1e16 -1e16 1", "0.1 0.2 0.3", "1e100 1.0 -1e100"]:
+        integrated = lisp_eval(f"(+ {args})", env)
+        assert integrated == lisp_eval(f"(apply + (list {args}))", env)
+    assert lisp_eval("(- (* x 10) (/ x 4))", env) == 9.75
+    assert lisp_eval("(+ x)", env) == 1.0
+
+    # Other numbers of arguments, and operators used as values, are calls
+    with pytest.raises(TypeError):
+        lisp_eval("(- x)", env)
+    assert lisp_eval("(+)", env) == 0
+    assert lisp_eval("(apply * (list 2 3 4))", env) == 24
+
+    # Integrated operators cannot be redefined globally, only bound locally
+    for source in ["(define + (lambda (a b) 99))", "(set! < (lambda (a b) 99))"]:
+        with pytest.raises(SyntaxError, match="cannot redefine"):
+            lisp_eval(source, env)
+    assert lisp_eval("(+ 1 2)", env) == 3 and lisp_eval("(< 1 2)", env) is True
+    assert lisp_eval("((lambda () (begin (define + -) (+ 1 2))))", env) == -1
+
+
+def test_compare_jumps(env, monkeypatch):
+    """Test that an if comparing a local with a number jumps in one opcode."""
+    lam = lis.compile(lis.parse("(lambda (n) (if (<= n 1) n 0))"))[0][1]
+    assert lam.code == [
+        (lis.JUMP_IF_NOT_LE, (0, 1, 3)),
+        (lis.LOAD_LOCAL, (0, 0)),
+        (lis.JUMP, 4),
+        (lis.CONST, 0),
+        (lis.RETURN, None),
+    ]
+
+    # Globals, outer locals, non-numbers and shadowed comparisons make calls
+    for source in [
+        "(lambda (n) (if (< x 1) 1 2))",
+        "(lambda (n) (lambda (m) (if (< n 1) 1 2)))",
+        "(lambda (n m) (if (< n m) 1 2))",
+        "(lambda (< n) (if (< n 1) 1 2))",
+    ]:
+        lam = lis.compile(lis.parse(source))[0][1]
+        while lam.code[0][0] == lis.MAKE_CLOSURE:
+            lam = lam.code[0][1]
+        assert (lis.JUMP_IF_FALSE, len(lam.code) - 2) in lam.code
+
+    monkeypatch.setattr(lis, "JIT_THRESHOLD", 10**9)  # run in the interpreter
+    lisp_eval("(define sign (lambda (x) (if (< x 0) -1 (if (= x 0) 0 1))))", env)
+    assert [lisp_eval(f"(sign {x})", env) for x in [-2.5, 0, 0.0, 3]] == [-1, 0, 0, 1]
+    lisp_eval(
+        "(define f (lambda (x) (if (>= x 2.5) (quote ge) (if (> x 1) 1 0))))", env
+    )
+    assert [lisp_eval(f"(f {x})", env) for x in [3, 2.5, 2, 1]] == ["ge", "ge", 1, 0]
+    lisp_eval("(define local (lambda (< x) (if (< x 1) 1 2)))", env)
+    assert lisp_eval("(local > 5)", env) == 1
+
+
+def test_global_env(env):
+    """Test that globals are numbered, with a slot for each number."""
+    lisp_eval("(define answer 42)", env)
+    i = lis._global_id("answer")
+    assert lis.compile(lis.parse("answer")) == [
+        (lis.LOAD_GLOBAL, i),
+        (lis.RETURN, None),
+    ]
+    assert env.slots[i] == 42 and env["answer"] == 42 and "answer" in env
+
+    # Names are numbered alike in every environment, but bound apart
+    other = lis.standard_env()
+    assert "answer" not in other and other.get("answer") is None
+    with pytest.raises(NameError, match="answer"):
+        lisp_eval("answer", other)
+    with pytest.raises(NameError, match="answer"):
+        lisp_eval("(set! answer 1)", other)
+    lisp_eval("(define answer 0)", other)
+    assert lisp_eval("answer", other) == 0 and lisp_eval("answer", env) == 42
+
+    # There is no default environment to evaluate in by accident
+    with pytest.raises(TypeError):
+        lis.eval(lis.parse("answer"))
+    with pytest.raises(TypeError):
+        lis.run("answer")
+
+
+def test_lexical_addressing(env):
+    """Test that variables resolve to frame slots or globals."""
+    code = lis.compile(lis.parse("(lambda (x) (lambda (y) (+ x y)))"))
+    outer = code[0][1]
+    inner = outer.code[0][1]
+    assert inner.code[:3] == [
+        (lis.LOAD_LOCAL, (1, 0)),
+        (lis.LOAD_LOCAL, (0, 0)),
+        (lis.BINARY_ADD, None),
+    ]
+
+    # Closures keep their own frames
+    lisp_eval("(define adder (lambda (x) (lambda (y) (+ x y))))", env)
+    lisp_eval("(define add5 (adder 5))", env)
+    lisp_eval("(define add7 (adder 7))", env)
+    assert lisp_eval("(add5 1)", env) == 6
+    assert lisp_eval("(add7 1)", env) == 8
+
+    # set! on captured and internally defined locals
+    lisp_eval(
+        """
+        (define counter
+            (lambda ()
+                (begin
+                    (define n 0)
+                    (lambda () (begin (set! n (+ n 1)) n)))))
+    """,
+        env,
+    )
+    lisp_eval("(define tick (counter))", env)
+    lisp_eval("(tick)", env)
+    assert lisp_eval("(tick)", env) == 2
+    with pytest.raises(NameError):
+        lisp_eval("n", env)
+
+    # Internal defines are local throughout the body, even before they run
+    lisp_eval("(define loop (lambda (n acc) 0))", env)  # a global not to call
+    lisp_eval(
+        """
+        (define f
+            (lambda (m)
+                (begin
+                    (define loop
+                        (lambda (n acc) (if (= n 0) acc (loop (- n 1) (+ acc n)))))
+                    (loop m 0))))
+    """,
+        env,
+    )
+    assert lisp_eval("(f 5)", env) == 15
+    lisp_eval(
+        """
+        (define parity
+            (lambda (m)
+                (begin
+                    (define ev (lambda (n) (if (= n 0) 1 (od (- n 1)))))
+                    (define od (lambda (n) (if (= n 0) 0 (ev (- n 1)))))
+                    (ev m))))
+    """,
+        env,
+    )
+    assert lisp_eval("(parity 7)", env) == 0 and lisp_eval("(parity 10)", env) == 1
+    with pytest.raises(NameError):
+        lisp_eval("od", env)
+
+    # set! on an undefined global
+    with pytest.raises(NameError):
+        lisp_eval("(set! undefined_variable 1)", env)
 
 
 def test_lispstr():
@@ -287,6 +815,16 @@ def test_lispstr():
     assert lis.lispstr("hello") == "hello"
     assert lis.lispstr([1, 2, 3]) == "(1 2 3)"
     assert lis.lispstr(["+", 1, 2]) == "(+ 1 2)"
+    assert lis.lispstr([]) == "()"
+    assert lis.lispstr([1, [2, [3, []]], lis.nil]) == "(1 (2 (3 ())) ())"
+    assert lis.lispstr(lis.Pair(1, lis.Pair([2, 3], 4))) == "(1 (2 3) . 4)"
+
+    # Deep nesting is written without recursion
+    depth = sys.getrecursionlimit() * 2
+    deep = lis.nil
+    for _ in range(depth):
+        deep = lis.Pair(deep, lis.nil)
+    assert lis.lispstr(deep) == "(" * depth + "()" + ")" * depth
 
 
 def run_performance_tests():
@@ -311,8 +849,9 @@ def run_performance_tests():
         env,
     )
 
+    expr = lis.prepare("(fact 10)")  # parse and compile outside the timing
     start_time = time.time()
-    result = lis.eval(lis.parse("(fact 10)"), env)
+    result = lis.run(expr, env)
     end_time = time.time()
 
     print(f"Factorial of 10: {result}")
@@ -330,8 +869,9 @@ def run_performance_tests():
         env,
     )
 
+    expr = lis.prepare("(fib 20)")
     start_time = time.time()
-    result = lis.eval(lis.parse("(fib 20)"), env)
+    result = lis.run(expr, env)
     end_time = time.time()
 
     print(f"Fibonacci of 20: {result}")